@@ -7,6 +7,7 @@ License: MIT
 import db
 import db_so
 import features
+import graph
 import hash
 import similarity
 import tagging
\ No newline at end of file
@@ -15,6 +15,10 @@ import warnings
 from sqlalchemy import *
 from sqlalchemy.orm import *
 from sqlalchemy.ext.declarative import declarative_base
+try:
+    from sqlalchemy.orm import selectinload
+except ImportError:  # SQLAlchemy < 1.2
+    selectinload = None
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
@@ -149,10 +153,11 @@ def parse_post(fname, user_cache):
 def import_dir(data_dir, session, max_files=-1):
     '''
     Given a directory with posts, loads them into the given database session.
+    Users already present in the database are reused, hence several directories may be imported one after another.
     '''
     files = sorted(glob.glob(os.path.join(data_dir, '*.txt')))
-    user_cache = dict()  # name -> User
-    s = Session()
+    user_cache = dict((u.name, u) for u in session.query(User))  # name -> User
+    s = session
     ctr = 0
     for f in files:
         if ctr == max_files:
@@ -169,6 +174,71 @@ def import_dir(data_dir, session, max_files=-1):
             log.debug("%d files imported..." % ctr)
     s.commit()
 
+# ----------------- Streaming & batch loading helpers ------------ #
+def _chunks(seq, n):
+    '''Splits a list into lists of at most n elements.'''
+    for i in xrange(0, len(seq), n):
+        yield seq[i:(i + n)]
+
+def _iter_windows(q, chunk_size):
+    '''Iterates over a Post query in windows of chunk_size posts ordered by id, running one query (plus eager loads) per window.'''
+    last_id = None
+    while True:
+        wq = q if last_id is None else q.filter(Post.id > last_id)
+        posts = wq.order_by(Post.id).limit(chunk_size).all()
+        if len(posts) == 0:
+            return
+        for p in posts:
+            yield p
+        last_id = posts[-1].id
+
+def iter_posts(session=None, chunk_size=1000, columns=None, with_user=False, with_replies=False):
+    '''
+    Iterates over all posts in the database in bounded memory, fetching chunk_size rows at a time.
+    Returns an iterator (not a Query), hence any further filtering must be done in Python.
+    Parameters:
+      columns      - if given, a list of Post attribute names to load (e.g. ['title', 'body']),
+                     the remaining columns are deferred.
+      with_user    - load the post author along with the post (joined in the same query).
+      with_replies - load the replies and their authors for each chunk with a constant number of extra queries,
+                     instead of one lazy load per post.
+                     With SQLAlchemy < 1.2 (no selectinload) the replies are loaded with subqueryload, which does not
+                     work with yield_per, hence the posts are then fetched in windows of chunk_size by id instead.
+    '''
+    q = (session or DBSession).query(Post)
+    if columns is not None:
+        q = q.options(load_only(*[getattr(Post, c) for c in columns]))
+    if with_user:
+        q = q.options(joinedload(Post.user))
+    if with_replies:
+        if selectinload is None:
+            return _iter_windows(q.options(subqueryload(Post.replies).joinedload(Reply.user)), chunk_size)
+        q = q.options(selectinload(Post.replies).joinedload(Reply.user))
+    return iter(q.order_by(Post.id).yield_per(chunk_size))
+
+def iter_post_texts(session=None, chunk_size=1000):
+    '''
+    Iterates over (id, all_text) pairs of all posts without constructing ORM objects.
+    This is what most of the feature extractors need.
+    '''
+    q = (session or DBSession).query(Post.id, Post.title, Post.body).order_by(Post.id).yield_per(chunk_size)
+    for id, title, body in q:
+        yield id, nvl(title) + ' ' + nvl(body)
+
+def get_posts(ids, session=None, chunk_size=500, with_user=False):
+    '''
+    Fetches posts with given ids in batches (one query per chunk_size ids) instead of one query.get() per post.
+    Returns a list of posts in the order of ids. Ids missing from the database are skipped.
+    '''
+    q = (session or DBSession).query(Post)
+    if with_user:
+        q = q.options(joinedload(Post.user))
+    ids = list(ids)
+    posts = dict()
+    for chunk in _chunks(ids, chunk_size):
+        posts.update((p.id, p) for p in q.filter(Post.id.in_(chunk)))
+    return [posts[id] for id in ids if id in posts]
+
 # ----------------- DB connection helpers ------------ #
 DBSession = scoped_session(sessionmaker())
 Engine = None
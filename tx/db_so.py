@@ -78,6 +78,44 @@ class Tag(Base):
     tag_name = Column(Unicode(255))
     wiki_post_id = Column(Integer)
 
+# ----------------- Streaming & batch loading helpers ------------ #
+def _chunks(seq, n):
+    for i in xrange(0, len(seq), n):
+        yield seq[i:(i + n)]
+
+def iter_posts(session=None, chunk_size=1000, columns=None, post_type_id=None):
+    '''
+    Iterates over posts in bounded memory, fetching chunk_size rows at a time. Returns an iterator (not a Query).
+    If columns is given (e.g. ['title', 'body', 'tags']), only those columns are loaded.
+    If post_type_id is given, only posts of that type are returned (1 - questions, 2 - answers).
+    '''
+    q = (session or DBSession).query(Post)
+    if columns is not None:
+        q = q.options(load_only(*[getattr(Post, c) for c in columns]))
+    if post_type_id is not None:
+        q = q.filter(Post.post_type_id == post_type_id)
+    return iter(q.order_by(Post.id).yield_per(chunk_size))
+
+def iter_post_texts(session=None, chunk_size=1000, post_type_id=None):
+    '''Iterates over (id, all_text) pairs of posts without constructing ORM objects.'''
+    q = (session or DBSession).query(Post.id, Post.title, Post.body)
+    if post_type_id is not None:
+        q = q.filter(Post.post_type_id == post_type_id)
+    for id, title, body in q.order_by(Post.id).yield_per(chunk_size):
+        yield id, nvl(title) + ' ' + nvl(body)
+
+def get_posts(ids, session=None, chunk_size=500):
+    '''
+    Fetches posts with given ids in batches (one query per chunk_size ids).
+    Returns a list of posts in the order of ids. Ids missing from the database are skipped.
+    '''
+    q = (session or DBSession).query(Post)
+    ids = list(ids)
+    posts = dict()
+    for chunk in _chunks(ids, chunk_size):
+        posts.update((p.id, p) for p in q.filter(Post.id.in_(chunk)))
+    return [posts[id] for id in ids if id in posts]
+
 # ----------------- DB connection helper ------------ #
 DBSession = scoped_session(sessionmaker())
 Engine = None
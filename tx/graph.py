@@ -0,0 +1,248 @@
+'''
+Texata 2014 Finals Solution.
+User interaction (reply) graph.
+
+Edges go from the asker (author of a post) to the replier (author of a reply to that post).
+The graph is kept as a sparse user x user adjacency matrix in CSR form, where
+A[i, j] is the number of times user j replied to a post by user i.
+
+Copyright: Konstantin Tretyakov
+License: MIT
+'''
+
+import logging
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import func
+
+from tx.db import Post, Reply
+
+log = logging.getLogger(__name__)
+
+
+# ------------------------- Edge extraction ---------------------- #
+def reply_edges(session, min_reply_id=None, max_reply_id=None, include_self=False):
+    '''
+    Returns a query over (asker_id, replier_id, timestamp) tuples, one for each reply in the database.
+    The edges are fetched in bulk by a single join, without loading any ORM objects.
+    Replies with id <= min_reply_id or id > max_reply_id are skipped (this is used for incremental updates).
+    Replies of users to their own posts are skipped unless include_self is True.
+    '''
+    q = session.query(Post.user_id, Reply.user_id, Reply.timestamp).join(Reply, Reply.post_id == Post.id)
+    q = q.filter(Post.user_id != None, Reply.user_id != None)
+    if not include_self:
+        q = q.filter(Reply.user_id != Post.user_id)
+    if min_reply_id is not None:
+        q = q.filter(Reply.id > min_reply_id)
+    if max_reply_id is not None:
+        q = q.filter(Reply.id <= max_reply_id)
+    return q
+
+
+# ------------------------- Reply graph ---------------------- #
+class ReplyGraph(object):
+    '''
+    Sparse asker -> replier graph with a few vectorized user statistics on top.
+    Besides the adjacency matrix and the user_ids/user_index mapping, the graph keeps
+    first_timestamp and last_timestamp - the time span of the interactions loaded so far.
+
+    >>> g = ReplyGraph()
+    >>> g.add_edges([(1, 2, None), (1, 2, None), (2, 1, None), (3, 2, None)])
+    >>> g.user_ids
+    [1, 2, 3]
+    >>> g.in_degree().tolist()
+    [1, 3, 0]
+    >>> g.reciprocity()
+    0.6666666666666666
+    >>> [uid for uid, score in g.top_users(g.pagerank(), 1)]
+    [2]
+    '''
+
+    def __init__(self, include_self=False):
+        self.include_self = include_self
+        self.clear()
+
+    def clear(self):
+        self.user_ids = []          # matrix index -> user id
+        self.user_index = dict()    # user id -> matrix index
+        self.adjacency = sp.csr_matrix((0, 0), dtype=np.int32)
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.last_reply_id = None   # Watermark for incremental loading from the database
+        self.seen_replies = 0       # Number of replies in the database with id <= last_reply_id
+
+    def _index(self, uid):
+        ix = self.user_index.get(uid)
+        if ix is None:
+            ix = len(self.user_ids)
+            self.user_index[uid] = ix
+            self.user_ids.append(uid)
+        return ix
+
+    def _resize(self, n):
+        '''Grows the adjacency matrix to n x n without touching the existing entries.'''
+        A = self.adjacency
+        if A.shape[0] == n:
+            return
+        indptr = np.concatenate([A.indptr, np.repeat(A.indptr[-1], n - A.shape[0])])
+        self.adjacency = sp.csr_matrix((A.data, A.indices, indptr), shape=(n, n))
+
+    def add_edges(self, edges):
+        '''
+        Adds a batch of (asker_id, replier_id, timestamp) edges to the graph.
+        Repeated edges are summed up into interaction counts.
+        '''
+        rows, cols = [], []
+        for asker, replier, ts in edges:
+            if asker == replier and not self.include_self:
+                continue
+            rows.append(self._index(asker))
+            cols.append(self._index(replier))
+            if ts is not None:
+                if self.first_timestamp is None or ts < self.first_timestamp:
+                    self.first_timestamp = ts
+                if self.last_timestamp is None or ts > self.last_timestamp:
+                    self.last_timestamp = ts
+        n = len(self.user_ids)
+        self._resize(n)
+        if len(rows) > 0:
+            delta = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n, n))
+            self.adjacency = self.adjacency + delta
+        log.debug("Added %d edges, graph has %d users and %d links", len(rows), n, self.adjacency.nnz)
+
+    def update(self, session):
+        '''
+        Loads all replies added to the database since the last call (or all of them on first call).
+        Replies are tracked by their id, hence this works for posts that are imported later on
+        with import_dir, even if their timestamps are older than what we have seen.
+        If the replies we have already seen are no longer all there (e.g. the database was re-created with init_db),
+        the graph is rebuilt from scratch.
+
+        >>> import shutil, tempfile
+        >>> from sqlalchemy import create_engine
+        >>> from sqlalchemy.orm import sessionmaker
+        >>> from tx.db import Base, import_dir
+        >>> from tx.bench import SyntheticCorpus
+        >>> engine = create_engine('sqlite://')
+        >>> Base.metadata.create_all(bind=engine)
+        >>> session = sessionmaker(bind=engine)()
+        >>> dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        >>> for k, d in enumerate(dirs):
+        ...     corpus = SyntheticCorpus(n_posts=20, n_users=10, seed=k)
+        ...     threads = corpus.forum_threads()
+        ...     for t in threads:
+        ...         t['id'] += 100 * k
+        ...     fnames = corpus.write_posts(d, threads)
+        >>> import_dir(dirs[0], session)
+        >>> g = ReplyGraph.from_db(session)
+        >>> import_dir(dirs[1], session)
+        >>> g.update(session)
+        >>> def links(g):
+        ...     A = g.adjacency.tocoo()
+        ...     return sorted((g.user_ids[i], g.user_ids[j], c) for i, j, c in zip(A.row, A.col, A.data))
+        >>> links(g) == links(ReplyGraph.from_db(session)) and g.adjacency.sum() > 0
+        True
+        >>> for d in dirs:
+        ...     shutil.rmtree(d)
+        '''
+        if self.last_reply_id is not None:
+            seen = session.query(func.count(Reply.id)).filter(Reply.id <= self.last_reply_id).scalar()
+            if seen != self.seen_replies:
+                log.warning("Replies were removed from the database since the last update, rebuilding the graph")
+                self.clear()
+        max_id, count = session.query(func.max(Reply.id), func.count(Reply.id)).one()
+        if max_id is None or max_id == self.last_reply_id:
+            return
+        self.add_edges(reply_edges(session, self.last_reply_id, max_id, self.include_self))
+        self.last_reply_id = max_id
+        self.seen_replies = count
+
+    @classmethod
+    def from_db(cls, session, include_self=False):
+        g = cls(include_self)
+        g.update(session)
+        return g
+
+    # ----- Statistics ----- #
+    def _binary(self):
+        '''Adjacency matrix with all interaction counts replaced by 1.'''
+        B = self.adjacency.copy()
+        B.data = np.ones_like(B.data)
+        return B
+
+    def _links(self):
+        '''Binary adjacency matrix without self-loops (those may be present if include_self is True).'''
+        B = self._binary()
+        d = B.diagonal()
+        if d.any():
+            B = (B - sp.diags(d, 0, shape=B.shape)).tocsr()
+            B.eliminate_zeros()
+        return B
+
+    def out_degree(self, weighted=True):
+        '''For each user, the number of replies received from others (or the number of distinct helpers, if not weighted).'''
+        A = self.adjacency if weighted else self._binary()
+        return np.asarray(A.sum(axis=1)).ravel()
+
+    def in_degree(self, weighted=True):
+        '''For each user, the number of replies given to others (or the number of distinct users helped, if not weighted).'''
+        A = self.adjacency if weighted else self._binary()
+        return np.asarray(A.sum(axis=0)).ravel()
+
+    def pagerank(self, damping=0.85, weighted=True, tol=1e-8, max_iter=100):
+        '''
+        PageRank-style "helper score" computed by power iteration.
+        Each asker distributes its score among the users who replied to it, proportionally to the number of replies,
+        hence users who help other helpful users get ranked higher.
+        Returns a vector of scores (summing up to 1), indexed in the same way as user_ids.
+        '''
+        n = len(self.user_ids)
+        if n == 0:
+            return np.zeros(0)
+        A = (self.adjacency if weighted else self._binary()).astype(np.float64)
+        out = np.asarray(A.sum(axis=1)).ravel()
+        dangling = out == 0
+        inv_out = np.zeros(n)
+        inv_out[~dangling] = 1.0 / out[~dangling]
+        # Row-normalize and transpose once, so that each iteration is a single sparse mat-vec product
+        M = (sp.diags(inv_out, 0) * A).T.tocsr()
+        r = np.ones(n) / n
+        for i in xrange(max_iter):
+            r_new = damping * (M * r + r[dangling].sum() / n) + (1 - damping) / n
+            err = np.abs(r_new - r).sum()
+            r = r_new
+            if err < tol:
+                break
+        else:
+            log.warning("PageRank did not converge in %d iterations", max_iter)
+        return r
+
+    def reciprocity(self):
+        '''
+        Fraction of (asker, replier) links for which there is also a link in the opposite direction.
+        Self-loops are ignored.
+
+        >>> g = ReplyGraph(include_self=True)
+        >>> g.add_edges([(1, 1, None), (1, 2, None)])
+        >>> g.reciprocity(), g.user_reciprocity().tolist()
+        (0.0, [0.0, 0.0])
+        '''
+        B = self._links()
+        if B.nnz == 0:
+            return 0.0
+        return float(B.multiply(B.T).nnz) / B.nnz
+
+    def user_reciprocity(self):
+        '''For each user, the fraction of their links (in either direction, self-loops ignored) which are reciprocated.'''
+        B = self._links()
+        mutual = np.asarray(B.multiply(B.T).sum(axis=1)).ravel()
+        total = np.asarray((B + B.T).sum(axis=1)).ravel()
+        result = np.zeros(len(self.user_ids))
+        nz = total > 0
+        result[nz] = 2.0 * mutual[nz] / total[nz]
+        return result
+
+    def top_users(self, scores, n=10):
+        '''Given a per-user score vector, returns a list of the top n (user_id, score) pairs.'''
+        idx = np.argsort(-scores)[0:n]
+        return [(self.user_ids[i], scores[i]) for i in idx]
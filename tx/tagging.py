@@ -11,7 +11,7 @@ import numpy as np
 from sklearn.svm import LinearSVC
 from sklearn.metrics import precision_score, recall_score
 
-from tx.features import SetOfWords, FeatureVector, nvl
+from tx.features import SET_OF_WORDS, SetOfWords, FeatureVector, nvl
 
 def find_features(wordsets, y, max_words=150):
     total_word_counts = Counter()